@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def dv01_shaped_cashflows():
+    #A small frame shaped like calculate_dv01's returned cashflows: two properties with curves,
+    #one DmAdj row and one property in a region without a curve
+    as_at_date = pd.Timestamp('2025-06-30')
+    rows = []
+    for code,name,region in [(101,'Alpha Tower','AUS'),(202,'Beta Park','JAP'),(303,'Gamma Mall','Unknown')]:
+        for months in [6,18,60]:
+            cashflow_date = as_at_date + pd.DateOffset(months=months)
+            for charge,rating,amount in [('BaseRent','A',1000.0),('BaseRent','NR',400.0),
+                                         ('Recovery','A',150.0),('BaseRentDmAdj','A',-30.0)]:
+                rows.append({'PropertyID':f'P{code}',
+                             'PropertyCode':code,
+                             'PropertyName':name,
+                             'MRIPropertyCharge':charge,
+                             'CreditRating':rating,
+                             'CashFlowDate':cashflow_date,
+                             'AsAtDate':as_at_date,
+                             'Region':region,
+                             'CLCNetAmount':amount * code / 100})
+    cashflows = pd.DataFrame(rows)
+    cashflows['TimeDiff'] = (cashflows['CashFlowDate'] - cashflows['AsAtDate']).map(lambda x: x.days) / 365.2475
+    curve_level = cashflows['Region'].map({'AUS':0.04,'JAP':0.01})
+    cashflows['rfr_to_use'] = curve_level + 0.002 * cashflows['TimeDiff']
+
+    #Same pricing as calculate_dv01
+    cashflows['CLCAmountRFRShock'] = cashflows['CLCNetAmount'] * np.exp(-cashflows['rfr_to_use'] * cashflows['TimeDiff'])
+    cashflows['CLCAmountRFRShock_1bp'] = cashflows['CLCNetAmount'] * np.exp(
+        -(cashflows['rfr_to_use'] + 0.0001) * cashflows['TimeDiff'])
+    cashflows['CLCAmountRFRShock_diff'] = np.where(
+        cashflows['MRIPropertyCharge'].str.contains('DmAdj'),
+        0,
+        cashflows['CLCAmountRFRShock'] - cashflows['CLCAmountRFRShock_1bp'])
+    return cashflows
+
+
+@pytest.fixture
+def dv01_cashflows():
+    return dv01_shaped_cashflows()
@@ -1,13 +1,19 @@
 import os
+import hashlib
+import json
+import time
 import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine
+from sqlalchemy.types import NVARCHAR
 import datetime as dt
 
 def db_connection(server, database):
     """Creates a database connection to SQL Server."""
     try:
-        engine = create_engine(f'mssql+pyodbc://{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server')
+        #fast_executemany sends each batch of rows as one parameter array rather than row by row
+        engine = create_engine(f'mssql+pyodbc://{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server',
+                               fast_executemany=True)
         return engine
     except Exception as e:
         print("Error establishing database connection:", e)
@@ -15,6 +21,51 @@ def db_connection(server, database):
     
 henrysconnection = db_connection('EASQLDEV','PropertyCashflows')
 
+#Rows sent per executemany batch. Larger batches are faster but hold more rows in driver memory.
+bulk_write_batch_size = 50000
+
+def write_table(df,name,con=None,if_exists='append',schema=None,method='executemany',batch_size=None):
+    #All table writes go through here. 'executemany' sends batches of rows as parameter arrays
+    #(fast_executemany on SQL Server); 'multi' sends multi-row INSERT ... VALUES statements, with the
+    #batch capped so a statement stays under the dialect's parameter limit. Any other engine,
+    #e.g. SQLite, falls back to plain batched to_sql. Prints the measured throughput.
+    con = henrysconnection if con is None else con
+    batch_size = bulk_write_batch_size if batch_size is None else batch_size
+    assert method in ['executemany','multi']
+
+    if method == 'multi':
+        parameter_limit = 2099 if con.dialect.name == 'mssql' else 999
+        batch_size = max(1,min(batch_size,parameter_limit // max(len(df.columns),1)))
+        if con.dialect.name == 'mssql':
+            #SQL Server also rejects INSERT ... VALUES with more than 1000 rows
+            batch_size = min(batch_size,1000)
+
+    #pandas creates text columns as VARCHAR(max) on SQL Server, which fast_executemany binds
+    #row by row, so give them a bounded NVARCHAR sized from the data (with room for later appends)
+    column_types = None
+    if con.dialect.name == 'mssql':
+        column_types = dict()
+        for column in df.select_dtypes('object').columns:
+            longest = df[column].dropna().astype(str).str.len().max()
+            longest = 0 if pd.isna(longest) else int(longest)
+            if longest <= 2000:
+                column_types[column] = NVARCHAR(max(255,2*longest))
+
+    start_time = time.perf_counter()
+    df.to_sql(name=name,
+              con=con,
+              schema=schema,
+              if_exists=if_exists,
+              index=False,
+              chunksize=batch_size,
+              dtype=column_types,
+              method='multi' if method == 'multi' else None)
+    elapsed = time.perf_counter() - start_time
+
+    rows_per_second = len(df)/elapsed if elapsed > 0 else float('inf')
+    print(f"Wrote {len(df)} rows to {name} in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s, {method}, batch size {batch_size})")
+    return elapsed
+
 def update_swap_rates():
     """We take discount margins from the 10y AUD/JPY swap rates."""
     """Pull the most recent 10y AUD/JPY swap rates from ENA/DataRaw"""
@@ -25,7 +76,7 @@ def update_swap_rates():
         and [DATE] > '2020-01-01'
         """
     swap_rate_table = pd.read_sql(swap_rate_query,con = enaconnection)
-    swap_rate_table.to_sql('SwapRates',henrysconnection,index=False,if_exists='replace')
+    write_table(swap_rate_table,'SwapRates',if_exists='replace')
     return None
 
 def update_detailed_swap_rates():
@@ -43,10 +94,7 @@ def update_detailed_swap_rates():
     
     detailed_swap_rates = pd.read_sql(detailed_swap_query,lifesqlconnection)
 
-    detailed_swap_rates.to_sql('SwapRatesDetailed',
-                               con=henrysconnection,
-                               index=False,
-                               if_exists='replace')
+    write_table(detailed_swap_rates,'SwapRatesDetailed',if_exists='replace')
     
     return None
 
@@ -57,6 +105,60 @@ def comma_remover(string_to_convert):
         converted_string = string_to_convert
     return converted_string
 
+#Columns that change with every MRI drop without the underlying leases changing
+fingerprint_excluded_columns = ['EffectiveDate','ModelEffectiveDate','ModelVersionEffectiveDate','ExtractedDateTune']
+
+def property_fingerprints(df):
+    #One content hash per PropertyCode. Rows are hashed individually and the sorted row hashes are
+    #hashed again, so the fingerprint doesn't depend on row order within the file.
+    content_columns = sorted([c for c in df.columns if c not in fingerprint_excluded_columns])
+    content = df[content_columns].astype(str).apply(lambda x: x.str.strip())
+    row_hashes = pd.util.hash_pandas_object(content,index=False).values
+    property_codes = pd.to_numeric(df['PropertyCode'],errors='coerce').values
+
+    row_hash_table = pd.DataFrame({'PropertyCode':property_codes,'RowHash':row_hashes}).dropna(subset=['PropertyCode'])
+    fingerprints = row_hash_table.groupby('PropertyCode')['RowHash'].agg(
+        lambda x: hashlib.sha1(np.sort(x.values).tobytes()).hexdigest()).reset_index()
+    fingerprints = fingerprints.rename({'RowHash':'Fingerprint'},axis=1)
+    fingerprints['PropertyCode'] = fingerprints['PropertyCode'].astype(np.int64)
+    return fingerprints
+
+def compare_property_fingerprints(current,previous):
+    #PropertyCodes whose fingerprints match in every SourceTable. A property or table present in only
+    #one of the two snapshots counts as changed.
+    compared = pd.merge(current[['SourceTable','PropertyCode','Fingerprint']],
+                        previous[['SourceTable','PropertyCode','Fingerprint']],
+                        how='outer',
+                        on=['SourceTable','PropertyCode'],
+                        suffixes=('','Previous'))
+    compared['Changed'] = compared['Fingerprint'] != compared['FingerprintPrevious']
+    changed_by_property = compared.groupby('PropertyCode')['Changed'].any()
+    return set(changed_by_property[~changed_by_property].index)
+
+def find_unchanged_properties(version):
+    #Compares the fingerprints stored for EffectiveDate = version against the previous EffectiveDate.
+    #Returns the PropertyCodes whose TenancyCashflow and PropertyLevelCashflow content is identical,
+    #and that previous EffectiveDate. Returns (set(),None) if there's nothing to compare against.
+    fingerprint_query = """SELECT *
+    from PropertyCashflows.dbo.PropertyCashflowFingerprints"""
+    try:
+        fingerprints = pd.read_sql(fingerprint_query,con=henrysconnection)
+    except:
+        return set(),None
+    fingerprints['EffectiveDate'] = pd.to_datetime(fingerprints['EffectiveDate'])
+    version = pd.to_datetime(version)
+
+    earlier_versions = fingerprints[fingerprints['EffectiveDate'] < version]['EffectiveDate']
+    current = fingerprints[fingerprints['EffectiveDate'] == version]
+    if len(earlier_versions) == 0 or len(current) == 0:
+        return set(),None
+    previous_version = earlier_versions.max()
+    previous = fingerprints[fingerprints['EffectiveDate'] == previous_version]
+
+    unchanged_properties = compare_property_fingerprints(current,previous)
+    print(f"{len(unchanged_properties)} of {current['PropertyCode'].nunique()} properties unchanged since {str(previous_version)[:10]}")
+    return unchanged_properties,str(previous_version)[:10]
+
 def upload_raw_mri_files(filepath,effective_date=None):
 
     henrysconnection = db_connection('EASQLDEV','PropertyCashflows')
@@ -156,11 +258,27 @@ def upload_raw_mri_files(filepath,effective_date=None):
             print(f)
             print(country)
 
-            to_upload.to_sql(name=f.split('.')[0],
-                                        con=henrysconnection,
-                                        if_exists='replace',
-                                        index=False)
-    
+            write_table(to_upload,f.split('.')[0],con=henrysconnection,if_exists='replace')
+
+            #Fingerprint each property's cashflows so later runs can skip unchanged properties
+            if f.split('.')[0] in ['TenancyCashflow','PropertyLevelCashflow']:
+                fingerprints = property_fingerprints(new_file_dict[country][f])
+                fingerprints['SourceTable'] = f.split('.')[0]
+                fingerprints['Currency'] = ccy
+                fingerprints['EffectiveDate'] = pd.to_datetime(effective_date)
+                existing_fingerprints_query = f"""
+                SELECT * FROM PropertyCashflows.dbo.PropertyCashflowFingerprints
+                Where [EffectiveDate] != '{effective_date_string}'
+                or [Currency] != '{ccy}'
+                or [SourceTable] != '{f.split('.')[0]}'
+                """
+                try:
+                    existing_fingerprints = pd.read_sql(existing_fingerprints_query,con=henrysconnection)
+                    fingerprints = pd.concat([fingerprints,existing_fingerprints])
+                except:
+                    pass
+                write_table(fingerprints,'PropertyCashflowFingerprints',con=henrysconnection,if_exists='replace')
+
     return None
 
 def upload_metrics_file(filepath,add_on=False):
@@ -189,10 +307,7 @@ def upload_metrics_file(filepath,add_on=False):
         return new_date
     global_metrics_file['Expiry FY'] = pd.to_datetime(global_metrics_file['Expiry FY'],errors='coerce')
     global_metrics_file['Expiry FY'] = global_metrics_file['Expiry FY'].map(fix_expiry_years)
-    global_metrics_file.to_sql(name='MetricsFile',
-                               con=henrysconnection,
-                               if_exists=replacementQ,
-                               index=False)
+    write_table(global_metrics_file,'MetricsFile',con=henrysconnection,if_exists=replacementQ)
     return None
 
 
@@ -264,13 +379,89 @@ def upload_metrics_summary_file(filepath,add_on=False):
         mfs = mfs[mfs["Valuation Date"].isin(valuation_dates_to_add)]
     replacementQ = 'append' if add_on else 'replace'
 
-    mfs.to_sql(name='PropertyMetricsSummaryNonMRI',
-               con=henrysconnection,
-               if_exists= replacementQ,
-               index=False
-               )
+    write_table(mfs,'PropertyMetricsSummaryNonMRI',con=henrysconnection,if_exists=replacementQ)
     return None
 
+property_dimension_cache = None
+
+def load_property_dimension(refresh=False):
+    #Loads PropertyNameMapper once per run and gives every MRI property code one integer
+    #PropertyKey. MRI codes, MRI names and metrics names all map onto that key, so the
+    #consolidation and discount margin steps join on the key instead of on strings.
+    #Keys are only stable within a run, so they are never written back to the DB.
+    global property_dimension_cache
+    if property_dimension_cache is not None and not refresh:
+        return property_dimension_cache
+
+    mapping_table_query = """
+    Select *
+    from PropertyCashflows.dbo.PropertyNameMapper"""
+    name_mapper = pd.read_sql(mapping_table_query,con=henrysconnection)
+
+    mapper_obj_columns = name_mapper.select_dtypes('object').columns
+    name_mapper[mapper_obj_columns] = name_mapper[mapper_obj_columns].apply(lambda x: x.str.strip())
+    name_mapper['MRIPropertyCode'] = pd.to_numeric(name_mapper['MRIPropertyCode'],errors='coerce')
+    name_mapper = name_mapper.dropna(subset=['MRIPropertyCode'])
+    name_mapper['MRIPropertyCode'] = name_mapper['MRIPropertyCode'].astype(np.int64)
+
+    property_codes = np.sort(name_mapper['MRIPropertyCode'].unique())
+    code_to_key = {code:key for key,code in enumerate(property_codes)}
+    name_mapper['PropertyKey'] = name_mapper['MRIPropertyCode'].map(code_to_key)
+
+    #One row per key, using the same min() tie-break the name mapping has always used
+    dimension = name_mapper.groupby('PropertyKey').agg(
+        MRIPropertyCode=('MRIPropertyCode','min'),
+        MRIPropertyName=('MRIPropertyName','min'),
+        MetricsPropertyName=('MetricsPropertyName','min')).reset_index()
+
+    property_dimension_cache = {
+        'dimension':dimension,
+        'MRIPropertyCode':code_to_key,
+        'MRIPropertyName':dict(name_mapper.dropna(subset=['MRIPropertyName']).groupby('MRIPropertyName')['PropertyKey'].min()),
+        'MetricsPropertyName':dict(name_mapper.dropna(subset=['MetricsPropertyName']).groupby('MetricsPropertyName')['PropertyKey'].min()),
+        'key_to_code':dict(zip(dimension['PropertyKey'],dimension['MRIPropertyCode'])),
+        'key_to_mri_name':dict(zip(dimension['PropertyKey'],dimension['MRIPropertyName'])),
+    }
+    return property_dimension_cache
+
+def map_property_keys(values,lookup):
+    #Maps a column of MRI codes, MRI names or metrics names onto PropertyKey.
+    #lookup is one of 'MRIPropertyCode','MRIPropertyName','MetricsPropertyName'.
+    property_dimension = load_property_dimension()
+    values = pd.Series(values)
+    if lookup == 'MRIPropertyCode':
+        values = pd.to_numeric(values,errors='coerce')
+    else:
+        values = values.map(lambda x: x.strip() if type(x) is str else x)
+    return values.map(property_dimension[lookup])
+
+def report_property_mismatches(checks):
+    #Checks a list of (source, frame, column, lookup) against the property dimension in one
+    #pass and prints a single table of values that don't resolve to a PropertyKey. If the frame
+    #already carries a PropertyKey (from its MRI code), names resolving to another key are flagged too.
+    mismatch_frames = []
+    for source,frame,column,lookup in checks:
+        frame = frame[[c for c in [column,'PropertyKey'] if c in frame.columns]].drop_duplicates()
+        keys = map_property_keys(frame[column].values,lookup)
+        keys.index = frame.index
+        unresolved = keys.isna()
+        if 'PropertyKey' in frame.columns and lookup != 'MRIPropertyCode':
+            conflicting = keys.notna() & frame['PropertyKey'].notna() & (keys != frame['PropertyKey'])
+        else:
+            conflicting = pd.Series(False,index=frame.index)
+        flagged = pd.DataFrame({'Source':source,
+                                'Column':column,
+                                'Value':frame[column],
+                                'Issue':np.where(unresolved,'Unmapped','KeyConflict')})[unresolved | conflicting]
+        mismatch_frames.append(flagged.drop_duplicates())
+
+    mismatches = pd.concat(mismatch_frames) if mismatch_frames else pd.DataFrame(
+        columns=['Source','Column','Value','Issue'])
+    if len(mismatches) > 0:
+        print(f"Property name mismatches ({len(mismatches)}):")
+        print(mismatches.to_string(index=False))
+    return mismatches
+
 def construct_consolidated_metrics(replace=False):
     #Take the relevant metrics from the non MRI metrics file, then merge this onto the 
     # MRI-style metrics file. The result is a "Consolidated metrics file"
@@ -289,11 +480,6 @@ def construct_consolidated_metrics(replace=False):
     mri_metrics = pd.read_sql(mri_metrics_query,con=henrysconnection)
     effective_date = mri_metrics['EffectiveDate'].unique()[0]
 
-    mapping_table_query = """
-    Select * 
-    from PropertyCashflows.dbo.PropertyNameMapper"""
-
-    name_mapper = pd.read_sql(mapping_table_query,con=henrysconnection)
     mri_metrics_column_namer = {c:c for c in mri_metrics.columns if c != 'index'}
     mri_metrics_column_namer['NetLettableArea'] = 'Net Lettable Area'
     mri_metrics_column_namer['WeightedAverageLeaseExpiryByArea'] = 'WALE by Area'
@@ -309,18 +495,25 @@ def construct_consolidated_metrics(replace=False):
     mri_metrics_column_namer['Location'] = 'Location'
     mri_metrics_column_namer['Sector'] = 'Sector'
 
-    name_dict = dict(name_mapper[['MRIPropertyCode','MetricsPropertyName']].groupby('MRIPropertyCode')['MetricsPropertyName'].min())
-    name_dict = {v:k for k,v in name_dict.items()} 
-
+    #Join both sides through the cached property dimension rather than on name strings
     if 'PropertyCode' not in non_mri_metrics.columns:
-        non_mri_metrics['PropertyCode'] = non_mri_metrics['Asset'].map(name_dict)
-        
+        non_mri_metrics['PropertyKey'] = map_property_keys(non_mri_metrics['Asset'].values,'MetricsPropertyName').values
+    else:
+        non_mri_metrics['PropertyKey'] = map_property_keys(non_mri_metrics['PropertyCode'].values,'MRIPropertyCode').values
+    mri_metrics['PropertyKey'] = map_property_keys(mri_metrics['PropertyCode'].values,'MRIPropertyCode').values
+
+    report_property_mismatches([
+        ('PropertyMetricsSummaryNonMRI',non_mri_metrics,'Asset','MetricsPropertyName'),
+        ('PropertyMetricsSummary',mri_metrics,'PropertyCode','MRIPropertyCode')])
 
-    nonmri_consol = non_mri_metrics[['Asset']+[c for c in mri_metrics_column_namer.values() if c in non_mri_metrics.columns]]
+    nonmri_consol = non_mri_metrics[['Asset','PropertyKey']+[
+        c for c in mri_metrics_column_namer.values() if c in non_mri_metrics.columns and c != 'PropertyCode']]
 
-    mri_consol = mri_metrics[[c for c in mri_metrics_column_namer.values() if c in mri_metrics.columns]]
+    mri_consol = mri_metrics[['PropertyKey']+[c for c in mri_metrics_column_namer.values() if c in mri_metrics.columns]]
 
-    metrics_consolidated = pd.merge(mri_consol,nonmri_consol,on='PropertyCode')
+    metrics_consolidated = pd.merge(mri_consol.dropna(subset=['PropertyKey']),
+                                    nonmri_consol.dropna(subset=['PropertyKey']),
+                                    on='PropertyKey').drop('PropertyKey',axis=1)
 
     if replace:
         # If replace: pull everything and concat new data
@@ -330,18 +523,18 @@ def construct_consolidated_metrics(replace=False):
         """
         rest_of_consolidated_metrics = pd.read_sql(rest_of_consolidated_metrics_query,con=henrysconnection)
         metrics_consolidated = pd.concat([metrics_consolidated,rest_of_consolidated_metrics])
-        metrics_consolidated.to_sql(name='PropertyMetricsConsolidated',schema='dbo',con=henrysconnection,
-                                    if_exists='replace',index=False)
+        write_table(metrics_consolidated,'PropertyMetricsConsolidated',schema='dbo',if_exists='replace')
     else:
-        metrics_consolidated.to_sql(name='PropertyMetricsConsolidated',schema='dbo',con=henrysconnection,
-                                    if_exists='append',index=False)
+        write_table(metrics_consolidated,'PropertyMetricsConsolidated',schema='dbo',if_exists='append')
     return None
 
 
-def generate_contracted_cashflows(AsAtDate):
+def generate_contracted_cashflows(AsAtDate,incremental=False):
     #Generates the contracted cashflows in the future for property
     #Takes relevant percentages to account for opex and the blend of 
     #credit ratings per property
+    #If incremental, properties whose fingerprints match the previous EffectiveDate
+    #reuse that EffectiveDate's ContractedCashflows instead of being rebuilt
 
     assert type(AsAtDate) is str
     AsAtDateList = AsAtDate.split('-')
@@ -385,6 +578,27 @@ def generate_contracted_cashflows(AsAtDate):
     plc_obj_columns = plc.select_dtypes('object').columns
     plc[plc_obj_columns] = plc[plc_obj_columns].apply(lambda x: x.str.strip())
 
+    reused_cashflows = None
+    if incremental:
+        unchanged_properties,previous_version = find_unchanged_properties(version)
+        if len(unchanged_properties) > 0:
+            previous_cashflows_query = f"""SELECT *
+            from PropertyCashflows.dbo.ContractedCashflows
+            WHERE EffectiveDate = '{previous_version}'
+            """
+            try:
+                previous_cashflows = pd.read_sql(previous_cashflows_query,con=henrysconnection)
+            except:
+                previous_cashflows = pd.DataFrame(columns=['PropertyCode'])
+            previous_cashflows['PropertyCode'] = pd.to_numeric(previous_cashflows['PropertyCode'])
+            reused_cashflows = previous_cashflows[previous_cashflows['PropertyCode'].isin(unchanged_properties)].copy()
+            reused_cashflows['EffectiveDate'] = pd.to_datetime(version)
+            reused_properties = reused_cashflows['PropertyCode'].unique()
+
+            tcf = tcf[~tcf['PropertyCode'].isin(reused_properties)]
+            plc = plc[~pd.to_numeric(plc['PropertyCode']).isin(reused_properties)]
+            print(f"Reusing {len(reused_properties)} properties from {previous_version}, rebuilding {tcf['PropertyCode'].nunique()}")
+
 
     cashflow_mapper_query = f"""SELECT * 
     FROM PropertyCashflows.dbo.CashflowTypeMapper
@@ -498,7 +712,9 @@ def generate_contracted_cashflows(AsAtDate):
         grouped_tcf_cashflows[grouped_tcf_cashflows['MRIPropertyCharge'].isin(['BaseRent','FreeRent','Recovery','OperatingExpenses'])
                                                 ].groupby([
         'PropertyID','PropertyCode','PropertyName','MRIPropertyCharge','CreditRating','CashFlowDate','EffectiveDate'])['Amount'].sum()).reset_index()
-    
+
+    if reused_cashflows is not None:
+        consolidated_cashflows = pd.concat([consolidated_cashflows,reused_cashflows[consolidated_cashflows.columns]])
 
     effective_date_string = consolidated_cashflows['EffectiveDate'].unique()[0]
     available_cashflow_data_query = f"""
@@ -516,10 +732,9 @@ def generate_contracted_cashflows(AsAtDate):
         """
             rest_of_the_data = pd.read_sql(rest_of_the_data_query,con=henrysconnection)
             consolidated_cashflows = pd.concat([consolidated_cashflows,rest_of_the_data])
-            consolidated_cashflows.to_sql('ContractedCashflows',con=henrysconnection,if_exists='replace',
-                                          index=False) 
+            write_table(consolidated_cashflows,'ContractedCashflows',if_exists='replace')
     else:
-        consolidated_cashflows.to_sql('ContractedCashflows',con=henrysconnection,if_exists='append',index=False)
+        write_table(consolidated_cashflows,'ContractedCashflows',if_exists='append')
 
     consolidated_dmadjusted_cashflows = merge_and_calculate_discount_adjustments(
         AsAtDate=AsAtDate,whole_cashflows=consolidated_cashflows)
@@ -541,12 +756,10 @@ def generate_contracted_cashflows(AsAtDate):
         earlier_cashflows = pd.read_sql(earlier_cashflows_query,con=henrysconnection)
         consolidated_dmadjusted_cashflows = pd.concat([consolidated_dmadjusted_cashflows,earlier_cashflows])
         consolidated_dmadjusted_cashflows = consolidated_dmadjusted_cashflows.drop_duplicates()
-        consolidated_dmadjusted_cashflows.to_sql('ContractedCashflowsDmAdj',con=henrysconnection,
-                                                if_exists='replace',index=False)
+        write_table(consolidated_dmadjusted_cashflows,'ContractedCashflowsDmAdj',if_exists='replace')
     else:
         consolidated_dmadjusted_cashflows = consolidated_dmadjusted_cashflows.drop_duplicates()
-        consolidated_dmadjusted_cashflows.to_sql('ContractedCashflowsDmAdj',con=henrysconnection,
-                                             if_exists='append',index=False)
+        write_table(consolidated_dmadjusted_cashflows,'ContractedCashflowsDmAdj',if_exists='append')
 
     return consolidated_dmadjusted_cashflows
 
@@ -566,31 +779,29 @@ def merge_and_calculate_discount_adjustments(AsAtDate,whole_cashflows):
     """
     metrics_summary_file = pd.read_sql(metrics_summary_query,con=henrysconnection)
 
-    property_mapper_query =  f"""SELECT *
-    From PropertyCashflows.dbo.PropertyNameMapper
-    """
-    property_mapper_file = pd.read_sql(property_mapper_query,con=henrysconnection)
-
-    metrics_summary_file = pd.merge(
-        metrics_summary_file,
-        property_mapper_file[["MRIPropertyName","MRIPropertyCode","MetricsPropertyName"]],
-        how='left',
-        left_on='Asset',
-        right_on='MetricsPropertyName')
+    property_dimension = load_property_dimension()
+    metrics_summary_file['PropertyKey'] = map_property_keys(metrics_summary_file['Asset'].values,'MetricsPropertyName').values
 
     max_val_date = metrics_summary_file['Valuation Date'].max()
     metrics_summary_file = metrics_summary_file[metrics_summary_file["Valuation Date"]==max_val_date]
 
     most_recent_discount_rates = metrics_summary_file[
-        ['MRIPropertyName',"MRIPropertyCode","Region","CLC Ownership Interest",'Discount Rate']]
-    most_recent_discount_rates['MRIPropertyCode'] = pd.to_numeric(most_recent_discount_rates['MRIPropertyCode'])
+        ['PropertyKey',"Region","CLC Ownership Interest",'Discount Rate']].dropna(subset=['PropertyKey'])
+    most_recent_discount_rates.insert(1,'MRIPropertyName',most_recent_discount_rates['PropertyKey'].map(property_dimension['key_to_mri_name']))
+    most_recent_discount_rates.insert(2,'MRIPropertyCode',most_recent_discount_rates['PropertyKey'].map(property_dimension['key_to_code']))
 
     if 'Discount Rate' not in contracted_cashflows.columns:
+        contracted_cashflows['PropertyKey'] = map_property_keys(contracted_cashflows['PropertyCode'].values,'MRIPropertyCode').values
+
+        report_property_mismatches([
+            ('PropertyMetricsSummaryNonMRI',metrics_summary_file,'Asset','MetricsPropertyName'),
+            ('ContractedCashflows',contracted_cashflows,'PropertyCode','MRIPropertyCode'),
+            ('ContractedCashflows',contracted_cashflows,'PropertyName','MRIPropertyName')])
+
         contracted_cashflows = pd.merge(contracted_cashflows,
                 most_recent_discount_rates,
                 how='left',
-                left_on=['PropertyName','PropertyCode'],
-                right_on=['MRIPropertyName','MRIPropertyCode'])
+                on='PropertyKey').drop('PropertyKey',axis=1)
         contracted_cashflows['CLC Ownership Interest'] = contracted_cashflows['CLC Ownership Interest'].fillna(0)
 
     rfr_dict_query = f"""Select * 
@@ -631,29 +842,30 @@ def merge_and_calculate_discount_adjustments(AsAtDate,whole_cashflows):
     return contracted_cashflows
 
 
+def time_diff_finder(mnemonic):
+    #Tenor in years from a SwapRatesDetailed mnemonic, e.g. AUDSwap5Y or JPY_OIS_1Y
+    assert type(mnemonic) is str
+    if "Swap" in mnemonic:
+        timeperiod = mnemonic.split('Swap')[1].strip()
+    elif "BILL" in mnemonic:
+        timeperiod = mnemonic.split("BILL")[1].strip()
+    else:
+        timeperiod = mnemonic.split("_OIS_")[1].strip()
+    if "M" in timeperiod:
+        time = timeperiod.split("M")[0]
+        return float(time)/12
+    elif "Y" in timeperiod:
+        time = timeperiod.split("Y")[0]
+        return float(time)
+    elif "ON" in timeperiod:
+        return 1/365
+    elif "W" in timeperiod:
+        return float(timeperiod.split("W")[0])*1/52
+
 def calculate_dv01(AsAtDate,input_cashflows=None):
     #Finds the swap curve relevant to the cashflows, finds the discounted and shocked discounted values
     #For each cashflow, then sums by property.
 
-    def time_diff_finder(mnemonic):
-        assert type(mnemonic) is str
-        if "Swap" in mnemonic:
-            timeperiod = mnemonic.split('Swap')[1].strip()
-        elif "BILL" in mnemonic:
-            timeperiod = mnemonic.split("BILL")[1].strip()
-        else:
-            timeperiod = mnemonic.split("_OIS_")[1].strip()
-        if "M" in timeperiod:
-            time = timeperiod.split("M")[0]
-            return float(time)/12
-        elif "Y" in timeperiod:
-            time = timeperiod.split("Y")[0]
-            return float(time)
-        elif "ON" in timeperiod:
-            return 1/365
-        elif "W" in timeperiod:
-            return float(timeperiod.split("W")[0])*1/52
-
     swap_rates_dates_query = """ SELECT distinct [DATE]
     from PropertyCashflows.dbo.SwapRatesDetailed
     order by [DATE] asc
@@ -711,8 +923,12 @@ def calculate_dv01(AsAtDate,input_cashflows=None):
         contracted_cashflows = pd.read_sql(input_cashflows_query,con=henrysconnection)
     else:
         contracted_cashflows = input_cashflows.copy()
-    
-    contracted_cashflows['rfr_to_use'] = contracted_cashflows.apply(lambda x: interpolate_swap_curve(x['TimeDiff'],x['Region']),axis=1)
+
+    #The curve rate only depends on region and tenor, so interpolate each distinct point once
+    contracted_cashflows = contracted_cashflows.drop(columns=['rfr_to_use'],errors='ignore')
+    curve_points = contracted_cashflows[['TimeDiff','Region']].drop_duplicates()
+    curve_points['rfr_to_use'] = curve_points.apply(lambda x: interpolate_swap_curve(x['TimeDiff'],x['Region']),axis=1)
+    contracted_cashflows = pd.merge(contracted_cashflows,curve_points,how='left',on=['TimeDiff','Region'])
 
     contracted_cashflows['DmAdjAmount'] = contracted_cashflows['CLCAmount']*(
         -1+np.exp(-contracted_cashflows['DiscountMargin']*contracted_cashflows['TimeDiff']))
@@ -734,8 +950,8 @@ def calculate_dv01(AsAtDate,input_cashflows=None):
     DV01_by_property = contracted_cashflows.groupby(['PropertyID','PropertyCode','PropertyName'])['CLCAmountRFRShock_diff'].sum().reset_index().sort_values(by='PropertyName')
 
     DV01_by_property['AsAtDate'] = AsAtDate
-    
-    DV01_by_property.to_sql('DV01_values',con=henrysconnection,if_exists='append',index=False)
+
+    write_table(DV01_by_property,'DV01_values',if_exists='append')
     
     return DV01_by_property,contracted_cashflows
 
@@ -745,3 +961,322 @@ def get_dv01_asat_dates():
   FROM [PropertyCashflows].[dbo].[DV01_values]"""
     dv01_dates = pd.read_sql(query,con=henrysconnection)
     return dv01_dates
+
+def export_cashflow_datasets(export_filepath,cashflows,dv01,file_format='parquet',batch_size=100000):
+    #Writes the final cashflow frame and DV01 results as datasets partitioned by AsAtDate and Region
+    #(hive style, e.g. cashflows/AsAtDate=2025-06-30/Region=AUS/). Parquet files carry column statistics
+    #so readers can skip row groups; 'ipc' writes uncompressed Arrow IPC files that can be memory-mapped.
+    #Consumers should read these through read_cashflow_dataset rather than re-querying ContractedCashflowsDmAdj.
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    assert file_format in ['parquet','ipc']
+    if file_format == 'parquet':
+        file_options = ds.ParquetFileFormat().make_write_options(write_statistics=True,compression='zstd')
+    else:
+        file_options = ds.IpcFileFormat().make_write_options(compression=None)
+
+    #DV01 is by property, so borrow each property's region from the cashflows
+    if 'Region' not in dv01.columns:
+        property_regions = cashflows.groupby(['PropertyID','PropertyCode','PropertyName'])['Region'].first().reset_index()
+        dv01 = pd.merge(dv01,property_regions,how='left',on=['PropertyID','PropertyCode','PropertyName'])
+
+    def prepare_batch(df):
+        #Partition keys as strings and dates as timestamps, done per batch so the input isn't copied whole
+        df = df.copy()
+        df['AsAtDate'] = pd.to_datetime(df['AsAtDate']).dt.strftime('%Y-%m-%d')
+        df['Region'] = df['Region'].fillna('Unknown').astype(str)
+        for date_column in ['CashFlowDate','EffectiveDate']:
+            if date_column in df.columns:
+                df[date_column] = pd.to_datetime(df[date_column])
+        #Object columns can hold mixed values (e.g. codes read as ints in one drop and strings in another),
+        #so write them all as strings to match the schema
+        for column in df.select_dtypes('object').columns:
+            df[column] = df[column].where(df[column].isna(),df[column].astype(str))
+        return df
+
+    for name,df in [('cashflows',cashflows),('dv01',dv01)]:
+        #Fix the schema from the whole frame's dtypes before anything is written, so a later batch
+        #can't fail partway through after delete_matching has removed the partition's old files
+        schema = pa.Schema.from_pandas(prepare_batch(df.head(0)),preserve_index=False)
+        for column in prepare_batch(df.head(0)).select_dtypes('object').columns:
+            schema = schema.set(schema.get_field_index(column),pa.field(column,pa.string()))
+
+        #Only one batch is converted to Arrow at a time; write_dataset pulls them from the generator
+        record_batches = (pa.RecordBatch.from_pandas(prepare_batch(df.iloc[i:i+batch_size]),schema=schema,preserve_index=False)
+                          for i in range(0,len(df),batch_size))
+        ds.write_dataset(record_batches,
+                         base_dir=os.path.join(export_filepath,name),
+                         schema=schema,
+                         format=file_format,
+                         file_options=file_options,
+                         partitioning=['AsAtDate','Region'],
+                         partitioning_flavor='hive',
+                         basename_template=f'{name}-{{i}}.{"parquet" if file_format == "parquet" else "arrow"}',
+                         existing_data_behavior='delete_matching')
+        print(f"Exported {len(df)} {name} rows to {os.path.join(export_filepath,name)}")
+    return None
+
+def read_cashflow_dataset(export_filepath,name='cashflows',columns=None,AsAtDate=None,region=None,file_format='parquet'):
+    #Reads back a dataset written by export_cashflow_datasets. Only the requested partitions
+    #and columns are read, and the files are memory-mapped rather than copied into memory.
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+
+    dataset = ds.dataset(os.path.join(export_filepath,name),
+                         format=file_format,
+                         partitioning='hive',
+                         filesystem=pafs.LocalFileSystem(use_mmap=True))
+    partition_filter = None
+    if AsAtDate is not None:
+        partition_filter = ds.field('AsAtDate') == str(AsAtDate)[:10]
+    if region is not None:
+        region_filter = ds.field('Region') == region
+        partition_filter = region_filter if partition_filter is None else partition_filter & region_filter
+
+    return dataset.to_table(columns=columns,filter=partition_filter).to_pandas()
+
+def build_cashflow_cube(AsAtDate,cashflows,value_column='CLCNetAmount'):
+    #Pivots the long cashflow table (as returned by calculate_dv01) into a dense array indexed by
+    #[property, MRIPropertyCharge, CreditRating, CashFlowDate]. Index maps for each axis, the region of
+    #each property and the curve rate / year fraction of each date are kept alongside, so discounting and
+    #shocks become broadcast multiplies and aggregation is an array reduction rather than a groupby.
+    cashflows = cashflows[pd.to_datetime(cashflows['AsAtDate']) == pd.to_datetime(AsAtDate)].copy()
+    cashflows['CashFlowDate'] = pd.to_datetime(cashflows['CashFlowDate'])
+    cashflows['Region'] = cashflows['Region'].fillna('Unknown')
+    cashflows['CreditRating'] = cashflows['CreditRating'].fillna('NR')
+    cashflows = cashflows.dropna(subset=['PropertyCode','MRIPropertyCharge','CashFlowDate'])
+
+    dimension_columns = ['PropertyCode','MRIPropertyCharge','CreditRating','CashFlowDate']
+    positions = []
+    labels = dict()
+    #Labels are kept as plain Python values so index maps look the same after save/load
+    for column in dimension_columns:
+        codes,uniques = pd.factorize(cashflows[column],sort=True)
+        positions.append(codes)
+        labels[column] = uniques.tolist()
+
+    shape = tuple(len(labels[c]) for c in dimension_columns)
+    flat_positions = np.ravel_multi_index(tuple(positions),shape)
+    values = np.bincount(flat_positions,weights=cashflows[value_column].fillna(0).values,
+                         minlength=int(np.prod(shape))).reshape(shape)
+
+    properties = cashflows.groupby('PropertyCode')[['PropertyID','PropertyName','Region']].first().reindex(labels['PropertyCode'])
+    region_codes,regions = pd.factorize(properties['Region'],sort=True)
+
+    dates = cashflows.groupby('CashFlowDate')[['TimeDiff']].first().reindex(labels['CashFlowDate'])
+    rates = cashflows.groupby(['Region','CashFlowDate'])['rfr_to_use'].first().unstack('CashFlowDate').reindex(
+        index=list(regions),columns=labels['CashFlowDate'])
+
+    cube = {
+        'AsAtDate':str(AsAtDate)[:10],
+        'value_column':value_column,
+        'values':values,
+        'labels':labels,
+        'index_maps':{c:{label:i for i,label in enumerate(labels[c])} for c in dimension_columns},
+        'properties':properties.reset_index(),
+        'regions':list(regions),
+        'property_region':region_codes,
+        'time_diff':dates['TimeDiff'].values.astype(float),
+        #Not every region pays on every date, so carry the nearest known rate across gaps
+        'rates':rates.ffill(axis=1).bfill(axis=1).values.astype(float),
+    }
+    return cube
+
+def save_cashflow_cube(cube,filepath):
+    #Writes the cube's arrays as .npy files and its labels as json, so it can be reopened as a memmap
+    os.makedirs(filepath,exist_ok=True)
+    for array_name in ['values','property_region','time_diff','rates']:
+        np.save(os.path.join(filepath,f'{array_name}.npy'),cube[array_name])
+
+    labels = {c:[str(l.date()) if c == 'CashFlowDate' else (l if type(l) is str else int(l)) for l in ls]
+              for c,ls in cube['labels'].items()}
+    with open(os.path.join(filepath,'labels.json'),'w') as f:
+        json.dump({'AsAtDate':cube['AsAtDate'],
+                   'value_column':cube['value_column'],
+                   'labels':labels,
+                   'regions':cube['regions']},f)
+    cube['properties'].to_csv(os.path.join(filepath,'properties.csv'),index=False)
+    return None
+
+def load_cashflow_cube(filepath,mmap_mode='r'):
+    #Reopens a cube written by save_cashflow_cube. The value array is memory-mapped by default.
+    with open(os.path.join(filepath,'labels.json')) as f:
+        saved = json.load(f)
+    labels = saved['labels']
+    labels['CashFlowDate'] = list(pd.to_datetime(labels['CashFlowDate']))
+
+    cube = {
+        'AsAtDate':saved['AsAtDate'],
+        'value_column':saved['value_column'],
+        'values':np.load(os.path.join(filepath,'values.npy'),mmap_mode=mmap_mode),
+        'labels':labels,
+        'index_maps':{c:{label:i for i,label in enumerate(ls)} for c,ls in labels.items()},
+        'properties':pd.read_csv(os.path.join(filepath,'properties.csv')),
+        'regions':saved['regions'],
+        'property_region':np.load(os.path.join(filepath,'property_region.npy')),
+        'time_diff':np.load(os.path.join(filepath,'time_diff.npy')),
+        'rates':np.load(os.path.join(filepath,'rates.npy')),
+    }
+    return cube
+
+def cube_discount_factors(cube,shock=0):
+    #Discount factors per [property, date], from each property's regional curve plus a parallel shock
+    #Properties without a regional curve get a zero factor, so they drop out of discounted totals and
+    #DV01 the same way calculate_dv01's groupby sum skips their NaN values
+    property_rates = cube['rates'][cube['property_region']]
+    return np.nan_to_num(np.exp(-(property_rates + shock) * cube['time_diff']))
+
+def cube_dv01(cube,shock=0.0001):
+    #DV01 as a contraction of the cube against the change in discount factors. DmAdj charges are
+    #left out of the shock, as in calculate_dv01.
+    charge_mask = np.array(['DmAdj' not in c for c in cube['labels']['MRIPropertyCharge']],dtype=float)
+    discount_factor_diff = cube_discount_factors(cube) - cube_discount_factors(cube,shock)
+    dv01_values = np.einsum('pcrt,c,pt->p',cube['values'],charge_mask,discount_factor_diff,optimize=True)
+
+    DV01_by_property = cube['properties'][['PropertyID','PropertyCode','PropertyName']].copy()
+    DV01_by_property['CLCAmountRFRShock_diff'] = dv01_values
+    DV01_by_property['AsAtDate'] = cube['AsAtDate']
+    return DV01_by_property.sort_values(by='PropertyName')
+
+def aggregate_cube(cube,by='CreditRating',discounted=False):
+    #Sums the cube down to one axis: 'PropertyCode','MRIPropertyCharge','CreditRating','CashFlowDate' or 'Region'
+    values = cube['values']
+    if discounted:
+        values = values * cube_discount_factors(cube)[:,None,None,:]
+
+    if by == 'Region':
+        property_totals = values.sum(axis=(1,2,3))
+        totals = np.bincount(cube['property_region'],weights=property_totals,minlength=len(cube['regions']))
+        return pd.Series(totals,index=cube['regions'],name=cube['value_column'])
+
+    axes = ['PropertyCode','MRIPropertyCharge','CreditRating','CashFlowDate']
+    other_axes = tuple(i for i,a in enumerate(axes) if a != by)
+    return pd.Series(values.sum(axis=other_axes),index=cube['labels'][by],name=cube['value_column'])
+
+def swap_curve_changes(AsAtDate,lookback_start=None):
+    #Daily changes in the AUD and JPY curves from SwapRatesDetailed up to AsAtDate, one column per
+    #(BaseCCY, tenor in years). Both curves share the same dates so their co-movement is kept.
+    swap_history_query = f"""SELECT [Date] as [DATE],[Mnemonic],[Mean],[BaseCCY]
+    from PropertyCashflows.dbo.SwapRatesDetailed
+    where [Date] <= '{AsAtDate}'
+    """
+    if lookback_start is not None:
+        swap_history_query += f"and [Date] >= '{lookback_start}'"
+    swap_history = pd.read_sql(swap_history_query,con=henrysconnection)
+    swap_history = swap_history[swap_history['BaseCCY'].isin(['AUD','JPY'])]
+    swap_history['time_diff'] = swap_history['Mnemonic'].map(time_diff_finder)
+
+    curve_history = swap_history.pivot_table(index='DATE',columns=['BaseCCY','time_diff'],values='Mean').sort_index()
+    #Tenors that aren't quoted every day would leave gaps in every path, so only keep full histories
+    curve_changes = curve_history.diff().iloc[1:].dropna(axis=1,thresh=int(0.9*(len(curve_history)-1))).dropna()
+    return curve_changes
+
+def simulate_rate_paths(curve_changes,n_paths,method='pca',n_components=3,horizon_days=1,seed=None):
+    #Generates n_paths correlated shocks to every curve point over horizon_days.
+    #'pca' draws from the leading principal components of the daily changes,
+    #'bootstrap' resamples whole historical days (so both curves move together).
+    rng = np.random.default_rng(seed)
+    daily_changes = curve_changes.values
+
+    if method == 'bootstrap':
+        sampled_days = rng.integers(0,len(daily_changes),size=(n_paths,horizon_days))
+        return daily_changes[sampled_days].sum(axis=1)
+
+    assert method == 'pca'
+    centred_changes = daily_changes - daily_changes.mean(axis=0)
+    eigenvalues,eigenvectors = np.linalg.eigh(np.cov(centred_changes,rowvar=False))
+    leading = np.argsort(eigenvalues)[::-1][:n_components]
+    loadings = eigenvectors[:,leading] * np.sqrt(np.clip(eigenvalues[leading],0,None))
+    if eigenvalues.sum() > 0:
+        explained = eigenvalues[leading].sum()/eigenvalues.sum()
+        print(f"{n_components} components explain {explained:.1%} of daily curve variance")
+
+    return rng.standard_normal((n_paths,n_components)) @ loadings.T * np.sqrt(horizon_days)
+
+def simulate_pv_dv01(AsAtDate,input_cashflows,n_paths=10000,method='pca',n_components=3,horizon_days=1,
+                     seed=None,percentiles=(1,5,25,50,75,95,99),max_chunk_elements=20000000,lookback_start=None,
+                     curve_changes=None):
+    #Monte Carlo version of calculate_dv01. Takes the cashflows returned by calculate_dv01 (which carry
+    #CLCNetAmount and rfr_to_use), shifts each cashflow's rate by the simulated move in its regional
+    #curve at its own tenor, and reprices PV and DV01 for every path.
+    #Paths are priced in chunks of at most max_chunk_elements (paths x cashflow points) so memory stays flat.
+    #Returns percentile tables of PV and DV01 by property and by region.
+    #curve_changes defaults to the SwapRatesDetailed history from swap_curve_changes.
+    if curve_changes is None:
+        curve_changes = swap_curve_changes(AsAtDate,lookback_start)
+    shocks = simulate_rate_paths(curve_changes,n_paths,method=method,n_components=n_components,
+                                 horizon_days=horizon_days,seed=seed)
+
+    cashflows = input_cashflows.dropna(subset=['TimeDiff','CLCNetAmount']).copy()
+    cashflows['Region'] = cashflows['Region'].fillna('Unknown')
+    cashflows['CurveCCY'] = cashflows['Region'].map({'AUS':'AUD','JAP':'JPY'})
+
+    #Cashflows without a regional curve are kept with a zero discount factor, so they add nothing to
+    #PV or DV01 on any path, the same as in calculate_dv01 and the cashflow cube
+    no_curve = cashflows['CurveCCY'].isna() | cashflows['rfr_to_use'].isna()
+    if no_curve.any():
+        print(f"{no_curve.sum()} cashflows across {cashflows[no_curve]['PropertyCode'].nunique()} properties have no regional curve and carry zero PV/DV01")
+    cashflows['DV01Amount'] = np.where(cashflows['MRIPropertyCharge'].str.contains('DmAdj'),0,cashflows['CLCNetAmount'])
+
+    #Rate only depends on region and tenor, so price one point per property and cashflow date
+    points = cashflows.groupby(['PropertyCode','Region','CurveCCY','TimeDiff','rfr_to_use'],dropna=False)[
+        ['CLCNetAmount','DV01Amount']].sum().reset_index().sort_values(by=['PropertyCode','TimeDiff'])
+
+    #Linear interpolation weights from curve points onto each cashflow's tenor, flat beyond the ends
+    curve_columns = list(curve_changes.columns)
+    interpolation_weights = np.zeros((len(points),len(curve_columns)))
+    for ccy in ['AUD','JPY']:
+        ccy_columns = [i for i,(c,_) in enumerate(curve_columns) if c == ccy]
+        if len(ccy_columns) == 0:
+            continue
+        ccy_rows = (points['CurveCCY'] == ccy).values
+        tenors = np.array([curve_columns[i][1] for i in ccy_columns])
+        for position,column in enumerate(ccy_columns):
+            basis = np.zeros(len(ccy_columns))
+            basis[position] = 1
+            interpolation_weights[ccy_rows,column] = np.interp(points['TimeDiff'].values[ccy_rows],tenors,basis)
+
+    time_diff = points['TimeDiff'].values
+    base_rates = points['rfr_to_use'].values
+    pv_amounts = points['CLCNetAmount'].values
+    dv01_amounts = points['DV01Amount'].values * (1 - np.exp(-0.0001*time_diff))
+
+    property_codes,property_starts = np.unique(points['PropertyCode'].values,return_index=True)
+    property_regions = points.groupby('PropertyCode')['Region'].first().reindex(property_codes).values
+
+    path_pv = np.empty((n_paths,len(property_codes)))
+    path_dv01 = np.empty((n_paths,len(property_codes)))
+    chunk_size = max(1,max_chunk_elements // max(len(points),1))
+    for chunk_start in range(0,n_paths,chunk_size):
+        chunk = slice(chunk_start,min(chunk_start+chunk_size,n_paths))
+        point_shocks = shocks[chunk] @ interpolation_weights.T
+        discount_factors = np.nan_to_num(np.exp(-(base_rates + point_shocks) * time_diff))
+        path_pv[chunk] = np.add.reduceat(discount_factors * pv_amounts,property_starts,axis=1)
+        path_dv01[chunk] = np.add.reduceat(discount_factors * dv01_amounts,property_starts,axis=1)
+
+    def percentile_table(pv,dv01,labels,label_name):
+        tables = []
+        for measure,values in [('PV',pv),('DV01',dv01)]:
+            table = pd.DataFrame(np.percentile(values,percentiles,axis=0).T,
+                                 columns=[f'P{p}' for p in percentiles])
+            table.insert(0,label_name,labels)
+            table.insert(1,'Measure',measure)
+            table['Mean'] = values.mean(axis=0)
+            tables.append(table)
+        result = pd.concat(tables).sort_values(by=[label_name,'Measure']).reset_index(drop=True)
+        result['AsAtDate'] = AsAtDate
+        return result
+
+    property_table = percentile_table(path_pv,path_dv01,property_codes,'PropertyCode')
+    property_names = cashflows.groupby('PropertyCode')[['PropertyID','PropertyName']].first()
+    property_table = pd.merge(property_names.reset_index(),property_table,on='PropertyCode')
+
+    regions = sorted(set(property_regions))
+    region_membership = np.array([[r == region for region in regions] for r in property_regions],dtype=float)
+    region_table = percentile_table(
+        np.hstack([path_pv @ region_membership,path_pv.sum(axis=1,keepdims=True)]),
+        np.hstack([path_dv01 @ region_membership,path_dv01.sum(axis=1,keepdims=True)]),
+        regions+['Total'],'Region')
+
+    return {'property':property_table,'region':region_table}
@@ -22,11 +22,14 @@ help_me.construct_consolidated_metrics(replace=True)
 
 help_me.update_detailed_swap_rates()
 
-cashflows = help_me.generate_contracted_cashflows(AsAtDate)
+cashflows = help_me.generate_contracted_cashflows(AsAtDate,incremental=True)
 
 dv01, cashflows = help_me.calculate_dv01(AsAtDate,input_cashflows=None)
 
 print(dv01)
 
+export_filepath = 'C:\\Users\\hbeckett\\Documents\\property-cashflows\\exports'
+help_me.export_cashflow_datasets(export_filepath,cashflows,dv01)
+
 # cashflows.to_csv("20260120 HS Cashflows.csv")
 # dv01.to_csv('20260120 dv01.csv')
\ No newline at end of file
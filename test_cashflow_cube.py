@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import helper_functions as help_me
+
+AS_AT_DATE = '2025-06-30'
+
+
+def expected_dv01(cashflows):
+    return cashflows.groupby('PropertyCode')['CLCAmountRFRShock_diff'].sum()
+
+
+def test_cube_dv01_matches_calculate_dv01_groupby(dv01_cashflows):
+    cube = help_me.build_cashflow_cube(AS_AT_DATE,dv01_cashflows)
+    dv01 = help_me.cube_dv01(cube).set_index('PropertyCode')['CLCAmountRFRShock_diff']
+
+    expected = expected_dv01(dv01_cashflows)
+    assert np.allclose(dv01.reindex(expected.index).values,expected.values)
+    assert dv01[303] == 0
+
+
+def test_discounted_aggregate_has_no_nans_for_properties_without_a_curve(dv01_cashflows):
+    cube = help_me.build_cashflow_cube(AS_AT_DATE,dv01_cashflows)
+    by_rating = help_me.aggregate_cube(cube,by='CreditRating',discounted=True)
+
+    expected = dv01_cashflows.groupby('CreditRating')['CLCAmountRFRShock'].sum()
+    assert not by_rating.isna().any()
+    assert np.allclose(by_rating.reindex(expected.index).values,expected.values)
+
+
+def test_region_aggregate_matches_long_table(dv01_cashflows):
+    cube = help_me.build_cashflow_cube(AS_AT_DATE,dv01_cashflows)
+    by_region = help_me.aggregate_cube(cube,by='Region')
+
+    expected = dv01_cashflows.groupby('Region')['CLCNetAmount'].sum()
+    assert np.allclose(by_region.reindex(expected.index).values,expected.values)
+
+
+def test_save_and_load_round_trip(dv01_cashflows,tmp_path):
+    cube = help_me.build_cashflow_cube(AS_AT_DATE,dv01_cashflows)
+    help_me.save_cashflow_cube(cube,str(tmp_path / 'cube'))
+    loaded = help_me.load_cashflow_cube(str(tmp_path / 'cube'))
+
+    assert isinstance(loaded['values'],np.memmap)
+    assert np.array_equal(np.asarray(loaded['values']),cube['values'])
+    assert loaded['labels'] == cube['labels']
+    for column,index_map in cube['index_maps'].items():
+        assert loaded['index_maps'][column] == index_map
+        assert [type(k) for k in loaded['index_maps'][column]] == [type(k) for k in index_map]
+
+    pd.testing.assert_frame_equal(help_me.cube_dv01(loaded).reset_index(drop=True),
+                                  help_me.cube_dv01(cube).reset_index(drop=True))
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import helper_functions as help_me
+
+pytest.importorskip('pyarrow')
+
+
+def dv01_by_property(cashflows):
+    dv01 = cashflows.groupby(['PropertyID','PropertyCode','PropertyName'])['CLCAmountRFRShock_diff'].sum().reset_index()
+    dv01['AsAtDate'] = '2025-06-30'
+    return dv01
+
+
+@pytest.mark.parametrize('file_format',['parquet','ipc'])
+def test_export_round_trip_with_partition_and_column_filter(dv01_cashflows,tmp_path,file_format):
+    cashflows = dv01_cashflows.copy()
+    #Mixed object values across batches must not break the write
+    cashflows['LeaseReference'] = pd.Series(['L1'] * (len(cashflows) - 1) + [303],index=cashflows.index,dtype=object)
+
+    help_me.export_cashflow_datasets(str(tmp_path),cashflows,dv01_by_property(dv01_cashflows),
+                                     file_format=file_format,batch_size=7)
+
+    aus = help_me.read_cashflow_dataset(str(tmp_path),'cashflows',columns=['PropertyCode','CLCNetAmount'],
+                                        AsAtDate='2025-06-30',region='AUS',file_format=file_format)
+    assert list(aus.columns) == ['PropertyCode','CLCNetAmount']
+    expected = cashflows[cashflows['Region'] == 'AUS']
+    assert len(aus) == len(expected)
+    assert aus['CLCNetAmount'].sum() == pytest.approx(expected['CLCNetAmount'].sum())
+
+    everything = help_me.read_cashflow_dataset(str(tmp_path),'cashflows',file_format=file_format)
+    assert len(everything) == len(cashflows)
+
+    dv01 = help_me.read_cashflow_dataset(str(tmp_path),'dv01',columns=['PropertyCode','Region'],
+                                         file_format=file_format)
+    assert dict(zip(dv01['PropertyCode'],dv01['Region'])) == {101:'AUS',202:'JAP',303:'Unknown'}
@@ -0,0 +1,61 @@
+import pandas as pd
+
+import helper_functions as help_me
+
+
+def tenancy_cashflows():
+    return pd.DataFrame({'PropertyCode':['101','101','202'],
+                         'CashflowType':['BaseRent','Recovery','BaseRent'],
+                         'CashFlowDate':pd.to_datetime(['2025-07-01','2025-07-01','2025-08-01']),
+                         'Amount':[100.0,20.0,50.0],
+                         'EffectiveDate':pd.to_datetime(['2025-06-30']*3),
+                         'ExtractedDateTune':pd.to_datetime(['2025-07-02']*3)})
+
+
+def snapshot(fingerprints,source='TenancyCashflow'):
+    fingerprints = fingerprints.copy()
+    fingerprints['SourceTable'] = source
+    return fingerprints
+
+
+def test_fingerprint_ignores_row_order():
+    cashflows = tenancy_cashflows()
+    shuffled = cashflows.iloc[[2,1,0]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(help_me.property_fingerprints(cashflows),
+                                  help_me.property_fingerprints(shuffled))
+
+
+def test_fingerprint_ignores_excluded_date_columns():
+    cashflows = tenancy_cashflows()
+    next_drop = cashflows.copy()
+    next_drop['EffectiveDate'] = pd.Timestamp('2025-12-31')
+    next_drop['ExtractedDateTune'] = pd.Timestamp('2026-01-05')
+    pd.testing.assert_frame_equal(help_me.property_fingerprints(cashflows),
+                                  help_me.property_fingerprints(next_drop))
+
+
+def test_fingerprint_changes_with_content():
+    cashflows = tenancy_cashflows()
+    changed = cashflows.copy()
+    changed.loc[0,'Amount'] = 101.0
+    before = help_me.property_fingerprints(cashflows).set_index('PropertyCode')['Fingerprint']
+    after = help_me.property_fingerprints(changed).set_index('PropertyCode')['Fingerprint']
+    assert before[101] != after[101]
+    assert before[202] == after[202]
+
+
+def test_compare_counts_missing_properties_as_changed():
+    previous = snapshot(help_me.property_fingerprints(tenancy_cashflows()))
+    current_cashflows = tenancy_cashflows()
+    current_cashflows = pd.concat([current_cashflows,current_cashflows.iloc[[2]].assign(PropertyCode='303')])
+    current = snapshot(help_me.property_fingerprints(current_cashflows))
+
+    assert help_me.compare_property_fingerprints(current,previous) == {101,202}
+    assert help_me.compare_property_fingerprints(current[current['PropertyCode'] != 202],previous) == {101}
+
+
+def test_compare_requires_every_source_table_to_match():
+    tenancy = snapshot(help_me.property_fingerprints(tenancy_cashflows()))
+    property_level = snapshot(help_me.property_fingerprints(tenancy_cashflows()),'PropertyLevelCashflow')
+    current = pd.concat([tenancy,property_level])
+    assert help_me.compare_property_fingerprints(current,tenancy) == set()
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import helper_functions as help_me
+
+AS_AT_DATE = '2025-06-30'
+CURVE_COLUMNS = pd.MultiIndex.from_tuples([('AUD',0.5),('AUD',5.0),('JPY',1.0),('JPY',10.0)],
+                                          names=['BaseCCY','time_diff'])
+
+
+def curve_changes(values):
+    return pd.DataFrame(values,columns=CURVE_COLUMNS,
+                        index=pd.date_range('2025-01-01',periods=len(values),freq='B'))
+
+
+@pytest.mark.parametrize('method',['pca','bootstrap'])
+def test_zero_shocks_reproduce_calculate_dv01(dv01_cashflows,method):
+    results = help_me.simulate_pv_dv01(AS_AT_DATE,dv01_cashflows,n_paths=20,method=method,seed=7,
+                                       curve_changes=curve_changes(np.zeros((30,4))))
+    by_property = results['property'].set_index(['PropertyCode','Measure'])['Mean']
+
+    expected_pv = dv01_cashflows.groupby('PropertyCode')['CLCAmountRFRShock'].sum()
+    expected_dv01 = dv01_cashflows.groupby('PropertyCode')['CLCAmountRFRShock_diff'].sum()
+    for code in expected_pv.index:
+        assert np.isclose(by_property[(code,'PV')],expected_pv[code])
+        assert np.isclose(by_property[(code,'DV01')],expected_dv01[code])
+
+    totals = results['region'].set_index(['Region','Measure'])['Mean']
+    assert np.isclose(totals[('Total','PV')],expected_pv.sum())
+    assert np.isclose(totals[('Total','DV01')],expected_dv01.sum())
+    assert np.isclose(totals[('Unknown','DV01')],0)
+
+
+@pytest.mark.parametrize('method',['pca','bootstrap'])
+def test_rate_paths_are_reproducible_for_a_seed(method):
+    rng = np.random.default_rng(0)
+    history = curve_changes(rng.normal(0,0.0005,size=(250,4)))
+
+    first = help_me.simulate_rate_paths(history,500,method=method,n_components=2,horizon_days=5,seed=42)
+    second = help_me.simulate_rate_paths(history,500,method=method,n_components=2,horizon_days=5,seed=42)
+    other = help_me.simulate_rate_paths(history,500,method=method,n_components=2,horizon_days=5,seed=43)
+
+    assert first.shape == (500,4)
+    assert np.array_equal(first,second)
+    assert not np.array_equal(first,other)
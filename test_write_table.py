@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+import helper_functions as help_me
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'write_table.db'}")
+
+
+@pytest.fixture
+def cashflows():
+    return pd.DataFrame({'PropertyCode':range(2500),
+                         'MRIPropertyCharge':['BaseRent','Recovery'] * 1250,
+                         'Amount':[float(i) for i in range(2500)]})
+
+
+@pytest.mark.parametrize('method',['executemany','multi'])
+def test_write_table_replace_then_append(sqlite_engine,cashflows,method):
+    help_me.write_table(cashflows,'ContractedCashflows',con=sqlite_engine,if_exists='replace',
+                        method=method,batch_size=300)
+    written = pd.read_sql('SELECT * FROM ContractedCashflows ORDER BY PropertyCode',con=sqlite_engine)
+    pd.testing.assert_frame_equal(written,cashflows)
+
+    help_me.write_table(cashflows.head(10),'ContractedCashflows',con=sqlite_engine,if_exists='append',
+                        method=method,batch_size=300)
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM ContractedCashflows',con=sqlite_engine)['n'][0] == 2510
+
+    help_me.write_table(cashflows.head(5),'ContractedCashflows',con=sqlite_engine,if_exists='replace',
+                        method=method,batch_size=300)
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM ContractedCashflows',con=sqlite_engine)['n'][0] == 5